@@ -1,10 +1,252 @@
-import textwrap
-from typing import List, Tuple
+import functools
+import io
+import json
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import wait as wait_for_futures
+from typing import Iterable, List, Optional, Tuple
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont, features
+
+BACKGROUND_COLOR = (0xF8, 0xF5, 0xF0)
+TEXT_COLOR = (0, 0, 0)
+
+# Samples are drawn as single-channel greyscale (255 = background, 0 = text)
+# and saved with a palette that maps each grey level onto the blend between
+# the text and background colours, so the output matches an RGB render at a
+# third of the pixel data.
+_PALETTE = [
+    round(text + (background - text) * level / 255)
+    for level in range(256)
+    for text, background in zip(TEXT_COLOR, BACKGROUND_COLOR)
+]
+
+# Formats that can store the palette image directly; anything else (e.g. JPEG)
+# is converted to RGB before saving.
+_PALETTE_FORMATS = {"PNG", "GIF", "BMP", "TIFF"}
+
+
+class FontLoadError(Exception):
+    """Raised when a font file cannot be read or parsed."""
+
+
+@functools.lru_cache(maxsize=1)
+def _read_font_file(font_path: str) -> bytes:
+    """
+    Read a font file once, so each size it is loaded at parses from memory.
+
+    Parameters:
+        font_path (str): Path to the font file.
+
+    Returns:
+        bytes: The raw contents of the font file.
+    """
+    with open(font_path, "rb") as font_file:
+        return font_file.read()
+
+
+@functools.lru_cache(maxsize=256)
+def _load_font(font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
+    """
+    Load a TrueType font, reusing previously parsed faces.
+
+    Parameters:
+        font_path (str): Path to the font file.
+        font_size (int): The requested font size.
+
+    Returns:
+        ImageFont.FreeTypeFont: The loaded font.
+    """
+    return ImageFont.truetype(io.BytesIO(_read_font_file(font_path)), font_size)
+
+
+@functools.lru_cache(maxsize=1024)
+def _bbox(font: ImageFont.FreeTypeFont, text: str) -> Tuple[int, int, int, int]:
+    """
+    Measure the bounding box of text, reusing previous measurements.
+
+    Parameters:
+        font (ImageFont.FreeTypeFont): The font to measure with.
+        text (str): The text to measure.
+
+    Returns:
+        Tuple[int, int, int, int]: The (left, top, right, bottom) bounding box.
+    """
+    return font.getbbox(text)
+
+
+@functools.lru_cache(maxsize=1024)
+def _length(font: ImageFont.FreeTypeFont, text: str) -> float:
+    """
+    Measure the advance width of text, reusing previous measurements.
+
+    Parameters:
+        font (ImageFont.FreeTypeFont): The font to measure with.
+        text (str): The text to measure.
+
+    Returns:
+        float: The advance width in pixels.
+    """
+    return font.getlength(text)
+
+
+# With raqm installed, Pillow's default layout applies kerning and complex
+# shaping, which pasting glyph tiles one by one cannot reproduce
+_SHAPED_LAYOUT = features.check("raqm")
+
+
+def _uses_glyph_tiles(text: str) -> bool:
+    """
+    Check whether text can be drawn from glyph tiles placed by advance.
+
+    This holds for Latin text under Pillow's basic layout, where it matches
+    ImageDraw.text exactly. Anything else is drawn with ImageDraw.text.
+
+    Parameters:
+        text (str): The text to be drawn.
+
+    Returns:
+        bool: True if the glyph tile path can be used.
+    """
+    # U+0000-U+024F covers Basic Latin through Latin Extended-B; combining
+    # marks and other scripts need shaping
+    return not _SHAPED_LAYOUT and all(ord(char) < 0x250 for char in text)
+
+
+def _text_width(font: ImageFont.FreeTypeFont, text: str) -> float:
+    """
+    Measure text the way FontSampleGenerator draws it. Text drawn from glyph
+    tiles is summed from per-character advances, so each character is only
+    measured once per font. Shaped text is measured as a whole.
+
+    Parameters:
+        font (ImageFont.FreeTypeFont): The font to measure with.
+        text (str): The text to measure.
+
+    Returns:
+        float: The width of the text in pixels.
+    """
+    if _uses_glyph_tiles(text):
+        return sum(_length(font, char) for char in text)
+    return _length(font, text)
+
+
+@functools.lru_cache(maxsize=4096)
+def _glyph(
+    font: ImageFont.FreeTypeFont, char: str
+) -> Tuple[Image.Image, int, int, float]:
+    """
+    Rasterize a single character once so it can be pasted wherever it recurs.
+
+    Parameters:
+        font (ImageFont.FreeTypeFont): The font to render with.
+        char (str): The character to render.
+
+    Returns:
+        Tuple[Image.Image, int, int, float]: The coverage mask of the glyph,
+        its left and top offsets from the drawing origin, and its advance.
+    """
+    left, top, right, bottom = _bbox(font, char)
+    tile = Image.new("L", (max(right - left, 1), max(bottom - top, 1)), 0)
+    ImageDraw.Draw(tile).text((-left, -top), char, fill=255, font=font)
+    return tile, left, top, _length(font, char)
+
+
+# Path of the font the caches above currently hold data for
+_cached_font_path: Optional[str] = None
+
+
+def _select_font(font_path: str) -> None:
+    """
+    Drop cached font data when switching to a different font file.
+
+    The measurement and glyph caches are keyed on font objects and keep them
+    alive, so without this a batch would accumulate every font file it has
+    seen. Scoping the caches to one font at a time bounds memory to a single
+    file, and a batch never comes back to a font it has finished with.
+
+    Parameters:
+        font_path (str): Path to the font file about to be used.
+    """
+    global _cached_font_path
+    if font_path != _cached_font_path:
+        for cache in (_read_font_file, _load_font, _bbox, _length, _glyph):
+            cache.cache_clear()
+        _cached_font_path = font_path
+
+
+def _save(img: Image.Image, output_path: str, compress_level: int) -> None:
+    """
+    Encode an image in memory and write it to disk in a single call.
+
+    A ".raw" path skips encoding entirely: the grey levels (0 = text,
+    255 = background) are written as-is, with the dimensions in a ".json"
+    sidecar file next to them.
+
+    Parameters:
+        img (Image.Image): The image to save.
+        output_path (str): The path where the image should be saved.
+        compress_level (int): The zlib level used for PNG output.
+    """
+    root, extension = os.path.splitext(output_path)
+    extension = extension.lower()
+    if extension == ".raw":
+        with open(output_path, "wb") as output_file:
+            output_file.write(img.tobytes())
+        with open(f"{root}.json", "w") as sidecar_file:
+            json.dump(
+                {"width": img.width, "height": img.height, "mode": "L"}, sidecar_file
+            )
+        return
+
+    # Encoding to memory first lets the file be written in a single call,
+    # rather than Pillow streaming small writes to the file descriptor.
+    image_format = Image.registered_extensions().get(extension, "PNG")
+    if image_format not in _PALETTE_FORMATS:
+        img = img.convert("RGB")
+
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, compress_level=compress_level)
+    with open(output_path, "wb") as output_file:
+        output_file.write(buffer.getbuffer())
+
+
+# Thread pool for saves queued with wait=False, created on first use so that
+# processes which only save synchronously never start it
+_save_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_save_pool() -> ThreadPoolExecutor:
+    """
+    Return the thread pool for queued saves, creating it on first use.
+
+    Pillow releases the GIL while encoding and writing, so queued saves
+    overlap with drawing the next sample.
+
+    Returns:
+        ThreadPoolExecutor: The shared save pool.
+    """
+    global _save_pool
+    if _save_pool is None:
+        _save_pool = ThreadPoolExecutor(max_workers=2)
+    return _save_pool
 
 
 class FontSampleGenerator:
+    """
+    Render a text sample for a single font file.
+
+    Font data is cached for one font file at a time: generating a sample
+    for a different font_path drops everything cached for the previous
+    one. Finish one font's samples before moving to the next; generators
+    for different fonts that alternate (or run on separate threads) keep
+    re-parsing their fonts. Use generate_batch to render many fonts in
+    parallel, since each worker process has its own caches.
+    """
+
+    MIN_FONT_SIZE = 10  # text is never shrunk below this size to make it fit
+    PNG_COMPRESS_LEVEL = 1  # zlib level; samples favour speed over file size
+
     def __init__(
         self, font_path: str, text: str, image_size: Tuple[int, int], font_size: int
     ):
@@ -12,6 +254,7 @@ class FontSampleGenerator:
         self.text = text
         self.image_size = image_size
         self.font_size = font_size
+        self._pending_saves: List[Future] = []
 
     def _wrap_text(self, font: ImageFont.FreeTypeFont, max_width: int) -> List[str]:
         """
@@ -24,45 +267,124 @@ class FontSampleGenerator:
         Returns:
             List[str]: List of lines after wrapping the text.
         """
-        return textwrap.wrap(self.text, width=int(max_width / font.getbbox("A")[2]))
+        space_width = _length(font, " ")
+        lines = []
+        current_line, current_width = "", 0.0
+        for word in self.text.split():
+            word_width = _text_width(font, word)
+            if current_line:
+                if current_width + space_width + word_width <= max_width:
+                    current_line += " " + word
+                    current_width += space_width + word_width
+                    continue
+                lines.append(current_line)
+
+            if word_width <= max_width:
+                current_line, current_width = word, word_width
+                continue
+
+            # Break words that are too wide for a line of their own
+            current_line, current_width = "", 0.0
+            for char in word:
+                char_width = _length(font, char)
+                if current_line and current_width + char_width > max_width:
+                    lines.append(current_line)
+                    current_line, current_width = char, char_width
+                else:
+                    current_line += char
+                    current_width += char_width
+
+        if current_line:
+            lines.append(current_line)
+        return lines
+
+    def _fits(self, font_size: int, max_width: int) -> bool:
+        """
+        Check whether the first wrapped line fits at the given font size.
+
+        Parameters:
+            font_size (int): The font size to try.
+            max_width (int): The maximum width of a text line.
+
+        Returns:
+            bool: True if the first line is no wider than max_width.
+        """
+        font = _load_font(self.font_path, font_size)
+        lines = self._wrap_text(font, max_width)
+        return _text_width(font, lines[0]) <= max_width
 
     def _adjust_font_size(
         self, font: ImageFont.FreeTypeFont, max_width: int
-    ) -> ImageFont.FreeTypeFont:
+    ) -> Tuple[ImageFont.FreeTypeFont, List[str]]:
         """
-        Adjust font size if the text is too wide.
+        Adjust font size if the text is too wide, leaving self.font_size
+        untouched so the generator can be reused for other fonts.
 
         Parameters:
             font (ImageFont.FreeTypeFont): The font to be adjusted.
             max_width (int): The maximum width of a text line.
 
         Returns:
-            ImageFont.FreeTypeFont: The adjusted font.
+            Tuple[ImageFont.FreeTypeFont, List[str]]: The adjusted font and
+            the text wrapped with it.
         """
+        # Most samples fit at the requested size, so wrap once and return
+        # without searching when they do
         lines = self._wrap_text(font, max_width)
-        while font.getbbox(lines[0])[2] > max_width and self.font_size > 10:
-            self.font_size -= 1
-            font = ImageFont.truetype(self.font_path, self.font_size)
-        return font
+        low, high = self.MIN_FONT_SIZE, font.size
+        if high <= low or not lines or _text_width(font, lines[0]) <= max_width:
+            return font, lines
+
+        # Rendered width grows with font size, so binary search for the
+        # largest size that fits, bottoming out at MIN_FONT_SIZE.
+        high -= 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self._fits(middle, max_width):
+                low = middle
+            else:
+                high = middle - 1
 
-    def _compute_total_text_height(
-        self, font: ImageFont.FreeTypeFont, lines: List[str]
-    ) -> float:
+        font = _load_font(self.font_path, low)
+        return font, self._wrap_text(font, max_width)
+
+    def _compute_text_extents(
+        self, font: ImageFont.FreeTypeFont, lines: List[str], line_step: float
+    ) -> Tuple[float, float]:
         """
-        Compute the total height of all lines, including spaces between them.
+        Compute the vertical extent of the inked text block.
 
         Parameters:
             font (ImageFont.FreeTypeFont): The font to be used.
             lines (List[str]): The wrapped lines of text.
+            line_step (float): The distance between consecutive line origins.
 
         Returns:
-            float: The total text height value.
+            Tuple[float, float]: The top and bottom of the block, relative to
+            the origin of the first line.
         """
-        line_height = font.getbbox("A")[3] - font.getbbox("A")[1]
-        spacing_between_lines = line_height * 0.2  # 20% space between lines.
-        return (
-            len(lines) * (line_height + spacing_between_lines) - spacing_between_lines
+        top = min(
+            (_bbox(font, line)[1] + i * line_step for i, line in enumerate(lines)),
+            default=0,
         )
+        bottom = max(
+            (_bbox(font, line)[3] + i * line_step for i, line in enumerate(lines)),
+            default=0,
+        )
+        return top, bottom
+
+    def _compute_line_height(self, font: ImageFont.FreeTypeFont) -> int:
+        """
+        Compute the height of a single line of text.
+
+        Parameters:
+            font (ImageFont.FreeTypeFont): The font to be used.
+
+        Returns:
+            int: The line height value.
+        """
+        _, top, _, bottom = _bbox(font, "A")
+        return bottom - top
 
     def _compute_start_height(self, total_text_height: float) -> float:
         """
@@ -76,42 +398,148 @@ class FontSampleGenerator:
         """
         return (self.image_size[1] - total_text_height) / 2
 
-    def generate_sample(self, output_path: str) -> None:
+    def _draw_line(
+        self,
+        img: Image.Image,
+        font: ImageFont.FreeTypeFont,
+        line: str,
+        position: Tuple[float, float],
+    ) -> None:
+        """
+        Draw a line of text, pasting cached glyph tiles where possible.
+
+        Parameters:
+            img (Image.Image): The "L" canvas to draw on.
+            font (ImageFont.FreeTypeFont): The font to be used.
+            line (str): The line of text to draw.
+            position (Tuple[float, float]): The origin of the line.
+        """
+        if not _uses_glyph_tiles(line):
+            ImageDraw.Draw(img).text(position, line, fill=0, font=font)
+            return
+
+        x, y = position
+        y = round(y)
+        for char in line:
+            tile, left, top, advance = _glyph(font, char)
+            img.paste(0, (round(x) + left, y + top), mask=tile)
+            x += advance
+
+    def generate_sample(self, output_path: str, wait: bool = True) -> None:
         """
         Generate font sample and save to the given output path.
 
+        The format follows the path's extension, defaulting to PNG. Use ".bmp"
+        to skip compression, or ".raw" for bare pixels plus a ".json" sidecar.
+
         Parameters:
             output_path (str): The path where the output image should be saved.
+            wait (bool): If False, queue the save on a background thread and
+                return straight away. Call flush() before using the file;
+                errors from queued saves are only raised there.
         """
-        img = Image.new("RGB", self.image_size, "#F8F5F0")
-        draw = ImageDraw.Draw(img)
-
+        _select_font(self.font_path)
         try:
-            font = ImageFont.truetype(self.font_path, self.font_size)
+            font = _load_font(self.font_path, self.font_size)
         except OSError as e:
-            raise Exception(f"Unable to load font at {self.font_path}. Error: {e}")
+            raise FontLoadError(
+                f"Unable to load font at {self.font_path}. Error: {e}"
+            ) from e
 
         max_width = self.image_size[0] - 20
-        lines = self._wrap_text(font, max_width)
-
         # Adjust font size if the first line is too wide
-        while (
-            draw.textbbox((0, 0), lines[0], font=font)[2] > max_width
-            and self.font_size > 10
-        ):
-            self.font_size -= 1
-            font = ImageFont.truetype(self.font_path, self.font_size)
-            lines = self._wrap_text(font, max_width)
+        font, lines = self._adjust_font_size(font, max_width)
+
+        # Line metrics depend only on the font, so measure them once
+        line_height = self._compute_line_height(font)
+        spacing_between_lines = line_height * 0.2  # 20% space between lines.
 
-        total_text_height = self._compute_total_text_height(font, lines)
-        current_height = self._compute_start_height(total_text_height)
+        # Centre the glyphs actually drawn, including ascender gaps and
+        # descenders, rather than a block of "A"-sized lines
+        top, bottom = self._compute_text_extents(
+            font, lines, line_height + spacing_between_lines
+        )
+        current_height = self._compute_start_height(bottom - top) - top
+
+        # Lay out the text before allocating the canvas, so a font that
+        # fails to load never costs an image buffer
+        img = Image.new("L", self.image_size, 255)
 
         for line in lines:
-            text_width = draw.textbbox((0, 0), line, font=font)[2]
-            width = (self.image_size[0] - text_width) / 2
-            draw.text((width, current_height), line, fill="black", font=font)
-            line_height = font.getbbox("A")[3] - font.getbbox("A")[1]
-            spacing_between_lines = line_height * 0.2
+            text_width = _text_width(font, line)
+            # Whole-pixel origins, so glyph tiles and ImageDraw.text's
+            # sub-pixel rendering place lines identically
+            width = (self.image_size[0] - round(text_width)) // 2
+            self._draw_line(img, font, line, (width, round(current_height)))
             current_height += line_height + spacing_between_lines
 
-        img.save(output_path)
+        img.putpalette(_PALETTE)
+
+        # Samples are throwaway previews, so favour encoding speed over file size
+        if wait:
+            _save(img, output_path, self.PNG_COMPRESS_LEVEL)
+        else:
+            self._pending_saves.append(
+                _get_save_pool().submit(
+                    _save, img, output_path, self.PNG_COMPRESS_LEVEL
+                )
+            )
+
+    def flush(self) -> None:
+        """
+        Wait for samples generated with wait=False to be written to disk.
+
+        Every queued save is waited on, even after one fails, before the
+        first error is raised.
+
+        Raises:
+            OSError: If any of the queued samples could not be saved.
+        """
+        pending_saves, self._pending_saves = self._pending_saves, []
+        wait_for_futures(pending_saves)
+        for future in pending_saves:
+            future.result()
+
+
+def _generate_one(
+    spec: Tuple[str, str, Tuple[int, int], int, str],
+) -> Tuple[str, Optional[str]]:
+    """
+    Generate a single sample from a batch specification.
+
+    Parameters:
+        spec (Tuple[str, str, Tuple[int, int], int, str]): The font path, text,
+            image size, font size and output path of the sample.
+
+    Returns:
+        Tuple[str, Optional[str]]: The output path, and the error message if
+        the sample could not be generated.
+    """
+    font_path, text, image_size, font_size, output_path = spec
+    try:
+        FontSampleGenerator(font_path, text, image_size, font_size).generate_sample(
+            output_path
+        )
+    except Exception as e:
+        return output_path, str(e)
+    return output_path, None
+
+
+def generate_batch(
+    specs: Iterable[Tuple[str, str, Tuple[int, int], int, str]],
+    max_workers: Optional[int] = None,
+) -> List[Tuple[str, Optional[str]]]:
+    """
+    Generate many samples in parallel, one worker process per CPU by default.
+
+    Parameters:
+        specs (Iterable[Tuple[str, str, Tuple[int, int], int, str]]): The font
+            path, text, image size, font size and output path of each sample.
+        max_workers (Optional[int]): The number of worker processes to use.
+
+    Returns:
+        List[Tuple[str, Optional[str]]]: For each spec, in order, the output
+        path and the error message if that sample failed, otherwise None.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_generate_one, specs, chunksize=4))
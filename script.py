@@ -1,23 +1,85 @@
 import os
 
-from main import FontSampleGenerator
+from main import generate_batch
 
 # Define constant parameters
 text = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
 image_size = (250, 250)
 font_size = 35
 directory = "./fonts/"  # replace with the path to your directory
+output_directory = "./output_files/"
+force = False  # set to True to regenerate samples that are already up to date
 
-# Ensure the output directory exists
-if not os.path.exists("./output_files/"):
-    os.makedirs("./output_files/")
 
-# Loop through all .ttf files in the directory
-for filename in os.listdir(directory):
-    if filename.endswith(".ttf"):
-        font_path = os.path.join(directory, filename)
-        output_path = f"./output_files/{filename[:-4]}.png"  # remove the .ttf extension and add .png
+def _output_path(filename: str) -> str:
+    """
+    Build the sample path for a font file.
 
-        # Initialize FontSampleGenerator and generate the sample
-        generator = FontSampleGenerator(font_path, text, image_size, font_size)
-        generator.generate_sample(output_path)
+    Parameters:
+        filename (str): Name of the .ttf file within the font directory.
+
+    Returns:
+        str: Path of the PNG sample in the output directory.
+    """
+    # remove the .ttf extension and add .png
+    return os.path.join(output_directory, f"{filename[:-4]}.png")
+
+
+def _is_up_to_date(entry: os.DirEntry) -> bool:
+    """
+    Check whether a font's sample already exists and is newer than the font.
+
+    Parameters:
+        entry (os.DirEntry): The font file's directory entry.
+
+    Returns:
+        bool: True if the sample can be reused as is.
+    """
+    try:
+        output_mtime = os.stat(_output_path(entry.name)).st_mtime
+    except FileNotFoundError:
+        return False
+    return output_mtime >= entry.stat().st_mtime
+
+
+def main() -> None:
+    # Ensure the output directory exists
+    os.makedirs(output_directory, exist_ok=True)
+
+    # Collect all .ttf files in the directory in a single pass; scandir
+    # entries carry their file type, so is_file() needs no extra stat call.
+    # Fonts whose sample is newer than the font file are skipped unless forced.
+    font_files = []
+    success_count = error_count = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".ttf") or not entry.is_file():
+                continue
+            if not force and _is_up_to_date(entry):
+                success_count += 1
+            else:
+                font_files.append(entry.name)
+
+    # Fonts are independent, so render them across all available cores
+    specs = [
+        (
+            os.path.join(directory, filename),
+            text,
+            image_size,
+            font_size,
+            _output_path(filename),
+        )
+        for filename in font_files
+    ]
+    for filename, (_, error) in zip(font_files, generate_batch(specs)):
+        if error is None:
+            success_count += 1
+        else:
+            error_count += 1
+            print(f"Failed to generate sample for {filename}: {error}")
+
+    print(f"Generated {success_count} samples ({error_count} failed).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
+import json
 import os
+import time
 
 import pytest
-from PIL import Image, ImageFont
+from PIL import Image, ImageDraw, ImageFont
 
-from main import FontSampleGenerator
+import main
+from main import (
+    BACKGROUND_COLOR,
+    FontLoadError,
+    FontSampleGenerator,
+    _load_font,
+    generate_batch,
+)
 
 
 @pytest.fixture
@@ -40,7 +49,8 @@ def test_content_verification(sample_generator):
 
     with Image.open(output_path) as img:
         assert img.size == (250, 250)
-        assert img.mode == "RGB"
+        assert img.mode == "P"
+        assert img.convert("RGB").getpixel((0, 0)) == BACKGROUND_COLOR
 
     os.remove(output_path)  # Clean up after test
 
@@ -53,3 +63,233 @@ def test_font_verification(sample_generator):
         ImageFont.truetype(sample_generator.font_path, sample_generator.font_size)
     except Exception:
         pytest.fail(f"Font at {sample_generator.font_path} couldn't be loaded!")
+
+
+def test_font_cache(sample_generator):
+    """Check that repeated loads of the same font and size reuse one face."""
+    first = _load_font(sample_generator.font_path, sample_generator.font_size)
+    second = _load_font(sample_generator.font_path, sample_generator.font_size)
+    assert first is second
+
+
+def test_wrap_text_fits_width(sample_generator):
+    """Check that every wrapped line fits within the requested width."""
+    font = _load_font(sample_generator.font_path, sample_generator.font_size)
+    max_width = sample_generator.image_size[0] - 20
+    lines = sample_generator._wrap_text(font, max_width)
+
+    assert "".join(lines) == sample_generator.text
+    assert all(font.getlength(line) <= max_width for line in lines)
+
+
+def test_font_size_not_mutated():
+    """Check that shrinking to fit leaves the configured font size intact."""
+    generator = FontSampleGenerator(
+        font_path="./tests/test_font.ttf",
+        text="ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+        image_size=(60, 250),
+        font_size=200,
+    )
+    output_path = "test_output_reuse.png"
+    generator.generate_sample(output_path)
+
+    assert generator.font_size == 200
+    os.remove(output_path)  # Clean up after test
+
+
+def test_missing_font():
+    """Check that an unreadable font raises FontLoadError."""
+    generator = FontSampleGenerator(
+        font_path="./tests/missing_font.ttf",
+        text="ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+        image_size=(250, 250),
+        font_size=45,
+    )
+    with pytest.raises(FontLoadError):
+        generator.generate_sample(output_path="test_output_missing.png")
+    assert not os.path.exists("test_output_missing.png")
+
+
+def test_vertical_centering(sample_generator):
+    """Check that the drawn text is vertically centred within a pixel."""
+    output_path = "test_output_centering.png"
+    sample_generator.generate_sample(output_path)
+
+    with Image.open(output_path) as img:
+        # Palette index 255 is the background; anything lower is ink
+        ink = Image.frombytes("L", img.size, img.tobytes())
+        _, top, _, bottom = ink.point(lambda v: 255 if v < 255 else 0).getbbox()
+        assert abs(top - (img.size[1] - bottom)) <= 1
+
+    os.remove(output_path)  # Clean up after test
+
+
+def test_generate_batch():
+    """Check that a batch renders every sample and reports failures per spec."""
+    output_paths = ["test_output_batch_1.png", "test_output_batch_2.png"]
+    specs = [
+        ("./tests/test_font.ttf", "ABCDEFGHIJKLMNOPQRSTUVWXYZ", (250, 250), 45, path)
+        for path in output_paths
+    ]
+    specs.append(
+        ("./tests/missing_font.ttf", "ABC", (250, 250), 45, "test_output_batch_3.png")
+    )
+    results = generate_batch(specs, max_workers=2)
+
+    assert [path for path, _ in results] == [spec[-1] for spec in specs]
+    assert [error is None for _, error in results] == [True, True, False]
+    for path in output_paths:
+        assert os.path.exists(path)
+        os.remove(path)  # Clean up after test
+
+
+def test_background_save(sample_generator):
+    """Check that queued saves are written once flushed."""
+    output_path = "test_output_queued.png"
+    sample_generator.generate_sample(output_path, wait=False)
+    sample_generator.flush()
+
+    with Image.open(output_path) as img:
+        assert img.size == (250, 250)
+
+    os.remove(output_path)  # Clean up after test
+
+
+def test_background_save_error(sample_generator, monkeypatch):
+    """Check that a failed queued save raises only after the others finish."""
+    output_path = "test_output_after_error.png"
+    save = main._save
+
+    def slow_save(img, path, compress_level):
+        if path == output_path:
+            time.sleep(0.2)  # still running when the first save fails
+        save(img, path, compress_level)
+
+    monkeypatch.setattr(main, "_save", slow_save)
+    sample_generator.generate_sample("missing_directory/test.png", wait=False)
+    sample_generator.generate_sample(output_path, wait=False)
+
+    with pytest.raises(OSError):
+        sample_generator.flush()
+    assert os.path.exists(output_path)
+    sample_generator.flush()  # the failed save is not raised again
+
+    os.remove(output_path)  # Clean up after test
+
+
+def test_raw_output(sample_generator):
+    """Check that a .raw path writes bare pixels with a dimensions sidecar."""
+    sample_generator.generate_sample("test_output_raw.raw")
+
+    with open("test_output_raw.json") as sidecar_file:
+        assert json.load(sidecar_file) == {"width": 250, "height": 250, "mode": "L"}
+    assert os.path.getsize("test_output_raw.raw") == 250 * 250
+
+    os.remove("test_output_raw.raw")  # Clean up after test
+    os.remove("test_output_raw.json")
+
+
+def test_jpeg_output(sample_generator):
+    """Check that formats without palette support are saved as RGB."""
+    output_path = "test_output_jpeg.jpg"
+    sample_generator.generate_sample(output_path)
+
+    with Image.open(output_path) as img:
+        assert img.format == "JPEG"
+        assert img.mode == "RGB"
+        assert img.size == (250, 250)
+
+    os.remove(output_path)  # Clean up after test
+
+
+def test_caches_scoped_to_current_font(sample_generator):
+    """Check that switching fonts drops the previous font's cached data."""
+    output_path = "test_output_switch.png"
+    sample_generator.generate_sample(output_path)
+    bbox_count = main._bbox.cache_info().currsize
+    assert main._glyph.cache_info().currsize >= 26  # one tile per letter
+
+    # Another path to the same file still counts as a different font
+    sample_generator.font_path = "tests/test_font.ttf"
+    sample_generator.text = "AB"
+    sample_generator.generate_sample(output_path)
+
+    # Only the new font's faces, measurements and tiles remain cached
+    assert _load_font.cache_info().currsize == 1
+    assert main._glyph.cache_info().currsize == 2
+    assert main._bbox.cache_info().currsize < bbox_count
+
+    os.remove(output_path)  # Clean up after test
+
+
+@pytest.mark.parametrize("text", ["AV", "To", "WAVE"])
+def test_glyph_tiles_match_draw_text(sample_generator, text):
+    """Check that tile drawing matches ImageDraw.text, kerned pairs included."""
+    font = _load_font(sample_generator.font_path, sample_generator.font_size)
+    tiled = Image.new("L", (250, 120), 255)
+    sample_generator._draw_line(tiled, font, text, (10, 10))
+    drawn = Image.new("L", (250, 120), 255)
+    ImageDraw.Draw(drawn).text((10, 10), text, fill=0, font=font)
+
+    assert tiled.tobytes() == drawn.tobytes()
+
+
+@pytest.mark.parametrize("shaped_layout, text", [(True, "AV"), (False, "Ωμέγα")])
+def test_shaped_text_uses_draw_text(sample_generator, monkeypatch, shaped_layout, text):
+    """Check that raqm layouts and non-Latin text fall back to ImageDraw.text."""
+    monkeypatch.setattr(main, "_SHAPED_LAYOUT", shaped_layout)
+    font = _load_font(sample_generator.font_path, sample_generator.font_size)
+    position = (10.5, 10.25)
+    tiled = Image.new("L", (250, 120), 255)
+    sample_generator._draw_line(tiled, font, text, position)
+    drawn = Image.new("L", (250, 120), 255)
+    ImageDraw.Draw(drawn).text(position, text, fill=0, font=font)
+
+    assert tiled.tobytes() == drawn.tobytes()
+
+
+def _linear_fit_size(generator, max_width):
+    """Find the fitted font size by stepping down one size at a time."""
+    for size in range(generator.font_size, generator.MIN_FONT_SIZE, -1):
+        font = _load_font(generator.font_path, size)
+        lines = generator._wrap_text(font, max_width)
+        if main._text_width(font, lines[0]) <= max_width:
+            return size
+    return generator.MIN_FONT_SIZE
+
+
+@pytest.mark.parametrize("max_width", [5, 25, 40, 70])
+def test_adjust_font_size_matches_linear_scan(max_width):
+    """Check that the binary search picks the same size as a linear scan."""
+    generator = FontSampleGenerator(
+        font_path="./tests/test_font.ttf",
+        text="ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+        image_size=(max_width + 20, 250),
+        font_size=200,
+    )
+    font, _ = generator._adjust_font_size(
+        _load_font(generator.font_path, generator.font_size), max_width
+    )
+    expected = _linear_fit_size(generator, max_width)
+
+    assert expected < generator.font_size  # the text has to shrink
+    assert font.size == expected
+    if max_width == 5:
+        assert font.size == generator.MIN_FONT_SIZE  # nothing fits, so floor
+
+
+@pytest.mark.parametrize("font_size", [35, 45])
+def test_glyph_tiles_match_draw_text_layout(sample_generator, monkeypatch, font_size):
+    """Check that centred lines at odd widths render the same on both paths."""
+    sample_generator.font_size = font_size
+    sample_generator.generate_sample("test_output_tiles.png")
+    monkeypatch.setattr(main, "_uses_glyph_tiles", lambda text: False)
+    sample_generator.generate_sample("test_output_drawn.png")
+
+    with Image.open("test_output_tiles.png") as tiled, Image.open(
+        "test_output_drawn.png"
+    ) as drawn:
+        assert tiled.tobytes() == drawn.tobytes()
+
+    os.remove("test_output_tiles.png")  # Clean up after test
+    os.remove("test_output_drawn.png")